@@ -4,10 +4,85 @@ from __future__ import annotations
 import json
 import math
 from dataclasses import dataclass, field
-from typing import Dict, Iterable, Mapping, MutableMapping, Optional
+from typing import Callable, Dict, Iterable, List, Mapping, MutableMapping, Optional, Tuple
 
+import numpy as np
 
-@dataclass
+try:
+    from numba import njit, prange
+except ImportError:  # pragma: no cover - numba is an optional accelerator
+    njit = None
+
+# Columns every scorer reserves, in order, at the start of its feature matrix.
+_BASE_COLUMNS = (
+    "email_engagement_rate",
+    "meetings_completed",
+    "industry_fit",
+    "annual_revenue",
+    "intent_score",
+)
+# Column holding the lead's ``deal_stage::<stage>`` weight, which is then
+# scaled by the scorer's plain ``deal_stage`` weight.
+_STAGE_COLUMN = len(_BASE_COLUMNS)
+
+
+def _column_weight(weights: Mapping[str, float], key: str) -> float:
+    """Return the weight for a feature column.
+
+    Stage weights count in full unless a plain ``deal_stage`` weight scales
+    them; every other missing weight is zero.
+    """
+
+    return weights.get(key, 1.0 if key == "deal_stage" else 0.0)
+
+
+# Argument names used by the generated scoring function, in call order.
+_SPECIALIZED_ARGS = dict(zip(_BASE_COLUMNS, ("e", "m", "i", "r", "n")))
+
+
+def _specialize(
+    weights: Mapping[str, float],
+    bias: float,
+) -> Tuple[Callable[..., Tuple[float, List[float]]], Tuple[str, ...]]:
+    """Generate a straight-line scoring function with ``weights`` inlined.
+
+    The function takes the five base features, the deal stage and the custom
+    attributes mapping, and returns ``(linear_sum, terms)``.  The second
+    element of the returned tuple names each entry of ``terms``.
+    """
+
+    names: List[str] = []
+    stage_weights = {
+        key[len("deal_stage::"):]: float(stage_weight)
+        for key, stage_weight in weights.items()
+        if key.startswith("deal_stage::")
+    }
+    # The stage lookup is bound once as a default argument rather than
+    # rebuilding the mapping inside the function on every call.
+    lines = ["def _scored(e, m, i, r, n, s, c, _g=_stage_weight):"]
+    for key in _BASE_COLUMNS + ("deal_stage",) + tuple(key for key in weights if key.startswith("custom::")):
+        weight = _column_weight(weights, key)
+        if not weight:
+            continue
+        if key in _SPECIALIZED_ARGS:
+            value = _SPECIALIZED_ARGS[key]
+        elif key == "deal_stage":
+            value = "_g(str(s), 0.0)"
+        else:
+            value = f"c.get({key[len('custom::'):]!r}, 0.0)"
+        lines.append(f"    t{len(names)} = {weight!r} * {value}")
+        names.append(key)
+    terms = [f"t{index}" for index in range(len(names))]
+    linear_sum = " + ".join([repr(float(bias)), *terms])
+    lines.append(f"    return {linear_sum}, [{', '.join(terms)}]")
+    source = "\n".join(lines)
+    # repr() spells non-finite weights as bare inf/nan names.
+    namespace: Dict[str, object] = {"_stage_weight": stage_weights.get, "inf": math.inf, "nan": math.nan}
+    exec(source, namespace)
+    return namespace["_scored"], tuple(names)
+
+
+@dataclass(slots=True)
 class LeadFeatures:
     """Container for normalised lead features."""
 
@@ -35,8 +110,74 @@ class LeadFeatures:
             vector[f"custom::{key}"] = value
         return vector
 
+    def fill_row(self, out_row: np.ndarray, custom_col_map: Mapping[str, int]) -> None:
+        """Write features into a zeroed, caller-owned row of a scorer matrix.
+
+        The deal stage column is left for the scorer to fill by stage code.
+        """
+
+        out_row[0] = self.email_engagement_rate
+        out_row[1] = self.meetings_completed
+        out_row[2] = self.industry_fit
+        out_row[3] = self.annual_revenue
+        out_row[4] = self.intent_score
+        for key, value in self.custom_attributes.items():
+            custom_col = custom_col_map.get(key)
+            if custom_col is not None:
+                out_row[custom_col] = value
+
+
+@dataclass(slots=True)
+class LeadFeaturesBatch:
+    """Columnar (struct of arrays) container for scoring many leads at once.
+
+    ``deal_stage`` holds stage names, which each scorer maps to its own stage
+    codes, and each entry of ``custom`` holds one column of custom attribute
+    values (zero where a lead lacks it).
+    """
+
+    lead_ids: List[str]
+    email_engagement_rate: np.ndarray
+    meetings_completed: np.ndarray
+    deal_stage: List[str]
+    industry_fit: np.ndarray
+    annual_revenue: np.ndarray
+    intent_score: np.ndarray
+    custom: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.lead_ids)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, object]]) -> "LeadFeaturesBatch":
+        """Build the column arrays from raw record dictionaries."""
 
-@dataclass
+        records = list(records)
+        count = len(records)
+
+        def column(name: str, cast=float, dtype=np.float64) -> np.ndarray:
+            return np.fromiter((cast(record.get(name, 0)) for record in records), dtype=dtype, count=count)
+
+        custom: Dict[str, np.ndarray] = {}
+        for row, record in enumerate(records):
+            for key, value in record.get("custom_attributes", {}).items():
+                values = custom.get(key)
+                if values is None:
+                    values = custom[key] = np.zeros(count)
+                values[row] = float(value)
+        return cls(
+            lead_ids=[str(record.get("lead_id", "unknown")) for record in records],
+            email_engagement_rate=column("email_engagement_rate"),
+            meetings_completed=column("meetings_completed", cast=int, dtype=np.int64),
+            deal_stage=[str(record.get("deal_stage", "lead")) for record in records],
+            industry_fit=column("industry_fit"),
+            annual_revenue=column("annual_revenue"),
+            intent_score=column("intent_score"),
+            custom=custom,
+        )
+
+
+@dataclass(slots=True)
 class LeadScoreResult:
     lead_id: str
     probability_to_close: float
@@ -49,26 +190,107 @@ class LeadScorer:
     def __init__(self, weights: Mapping[str, float], bias: float = -1.0) -> None:
         self._weights = dict(weights)
         self._bias = bias
+        # Single leads are scored by straight-line Python generated for these
+        # weights; with a handful of columns NumPy's per-call overhead costs
+        # more than it saves, so arrays are only used by the batch APIs.
+        self._scored, self._term_names = _specialize(self._weights, bias)
+        # Freeze the weight schema so scoring is a single dot product.  Only
+        # keys that ``to_vector`` can produce get a column.
+        self._keys = _BASE_COLUMNS + ("deal_stage",) + tuple(
+            key for key in self._weights if key.startswith("custom::")
+        )
+        # Single precision halves the bytes the batch GEMV reads; per-lead
+        # scores and contributions never touch these arrays.
+        self._w = np.fromiter(
+            (_column_weight(self._weights, key) for key in self._keys),
+            dtype=np.float32,
+            count=len(self._keys),
+        )
+        # Stage name -> code into ``_stage_w``.  Code 0 is the zero weight
+        # shared by every stage the weights do not mention.
+        self._stage_codes = {
+            key[len("deal_stage::"):]: code
+            for code, key in enumerate((key for key in self._weights if key.startswith("deal_stage::")), start=1)
+        }
+        self._stage_w = np.array(
+            [0.0, *(self._weights[f"deal_stage::{stage}"] for stage in self._stage_codes)],
+            dtype=np.float32,
+        )
+        self._custom_cols = {
+            key[len("custom::"):]: index
+            for index, key in enumerate(self._keys)
+            if key.startswith("custom::")
+        }
 
     @classmethod
     def from_json(cls, payload: str) -> "LeadScorer":
         data = json.loads(payload)
         return cls(weights=data["weights"], bias=data.get("bias", -1.0))
 
-    def score(self, lead_id: str, features: LeadFeatures) -> LeadScoreResult:
-        vector = features.to_vector(self._weights)
-        linear_sum = self._bias
+    def _batch_matrix(self, batch: LeadFeaturesBatch) -> np.ndarray:
+        matrix = np.zeros((len(batch), len(self._keys)), dtype=np.float32)
+        matrix[:, 0] = batch.email_engagement_rate
+        matrix[:, 1] = batch.meetings_completed
+        matrix[:, 2] = batch.industry_fit
+        matrix[:, 3] = batch.annual_revenue
+        matrix[:, 4] = batch.intent_score
+        stage_codes = np.fromiter(
+            (self._stage_codes.get(stage, 0) for stage in batch.deal_stage),
+            dtype=np.intp,
+            count=len(batch),
+        )
+        matrix[:, _STAGE_COLUMN] = self._stage_w[stage_codes]
+        for key, values in batch.custom.items():
+            custom_col = self._custom_cols.get(key)
+            if custom_col is not None:
+                matrix[:, custom_col] = values
+        return matrix
+
+    def _probabilities(self, matrix: np.ndarray) -> np.ndarray:
+        z = matrix @ self._w
+        z += self._bias
+        return _sigmoid(z, np.empty_like(z))
+
+    def score(self, lead_id: str, features: LeadFeatures, return_contributions: bool = True) -> LeadScoreResult:
+        linear_sum, terms = self._scored(
+            features.email_engagement_rate,
+            features.meetings_completed,
+            features.industry_fit,
+            features.annual_revenue,
+            features.intent_score,
+            features.deal_stage,
+            features.custom_attributes,
+        )
         contributions: Dict[str, float] = {}
-        for key, value in vector.items():
-            weight = self._weights.get(key, 0.0)
-            contribution = weight * value
-            linear_sum += contribution
-            if abs(contribution) > 0.001:
-                contributions[key] = contribution
-        probability = 1 / (1 + math.exp(-linear_sum))
-        return LeadScoreResult(lead_id=lead_id, probability_to_close=probability, contributing_factors=contributions)
-
-    def batch_score(self, batch: Iterable[Dict[str, object]]) -> Iterable[LeadScoreResult]:
+        if return_contributions:
+            contributions = {name: term for name, term in zip(self._term_names, terms) if abs(term) > 0.001}
+        return LeadScoreResult(
+            lead_id=lead_id,
+            probability_to_close=1.0 / (1.0 + math.exp(-linear_sum)),
+            contributing_factors=contributions,
+        )
+
+    def score_batch(self, batch: LeadFeaturesBatch) -> np.ndarray:
+        """Return close probabilities for a columnar batch in one matrix-vector multiply."""
+
+        return self._probabilities(self._batch_matrix(batch))
+
+    def batch_score_array(self, records: Iterable[Mapping[str, object]]) -> np.ndarray:
+        """Return close probabilities for ``records`` using one matrix-vector multiply."""
+
+        return self.score_batch(LeadFeaturesBatch.from_records(records))
+
+    def batch_score(
+        self,
+        batch: Iterable[Dict[str, object]],
+        return_contributions: bool = True,
+    ) -> Iterable[LeadScoreResult]:
+        """Yield a result per record, reading ``batch`` lazily.
+
+        Use :meth:`batch_score_array` when only probabilities are needed; it
+        scores every record with one matrix-vector multiply.
+        """
+
         for record in batch:
             features = LeadFeatures(
                 email_engagement_rate=float(record.get("email_engagement_rate", 0.0)),
@@ -82,7 +304,30 @@ class LeadScorer:
                     for key, value in record.get("custom_attributes", {}).items()
                 },
             )
-            yield self.score(str(record.get("lead_id", "unknown")), features)
+            yield self.score(str(record.get("lead_id", "unknown")), features, return_contributions)
+
+
+if njit is not None:
+
+    @njit(parallel=True, cache=True)
+    def _sigmoid_kernel(z, out):  # pragma: no cover - compiled by numba
+        for i in prange(z.shape[0]):
+            out[i] = 1.0 / (1.0 + math.exp(-z[i]))
+
+
+def _sigmoid(z: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Write the logistic function of ``z`` into ``out`` and return it."""
+
+    if njit is not None:
+        _sigmoid_kernel(z, out)
+        return out
+    np.negative(z, out=out)
+    # Keep exp finite; this far out the sigmoid is already 0 to the dtype's
+    # precision.
+    np.minimum(out, np.log(np.finfo(out.dtype).max) - 1.0, out=out)
+    np.exp(out, out=out)
+    out += 1.0
+    return np.reciprocal(out, out=out)
 
 
 DEFAULT_WEIGHTS = {
@@ -102,7 +347,6 @@ DEFAULT_WEIGHTS = {
 
 DEFAULT_SCORER = LeadScorer(DEFAULT_WEIGHTS, bias=-2.0)
 
-
 def score_lead(lead_id: str, features: LeadFeatures, scorer: Optional[LeadScorer] = None) -> LeadScoreResult:
     scorer = scorer or DEFAULT_SCORER
     return scorer.score(lead_id, features)
@@ -110,6 +354,7 @@ def score_lead(lead_id: str, features: LeadFeatures, scorer: Optional[LeadScorer
 
 __all__ = [
     "LeadFeatures",
+    "LeadFeaturesBatch",
     "LeadScoreResult",
     "LeadScorer",
     "DEFAULT_SCORER",
@@ -0,0 +1,145 @@
+"""HTTP and JSON helpers shared by the HubSpot integration scripts."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speed-up
+    orjson = None
+
+
+# Seconds a contact-id lookup is served from memory before HubSpot is asked again.
+CONTACT_CACHE_TTL = 60.0
+# Most contact ids kept in memory per client.
+CONTACT_CACHE_SIZE = 4096
+
+
+def dumps(payload: object) -> bytes:
+    """Serialise ``payload`` to a JSON request body."""
+
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
+def loads(content: Union[bytes, str]) -> Any:
+    """Parse a JSON response body or webhook payload."""
+
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def build_session(
+    headers: Dict[str, str],
+    pool_maxsize: int = 20,
+    create_urls: Iterable[str] = (),
+) -> requests.Session:
+    """Return a keep-alive session that backs off on throttling and gateway errors.
+
+    Retries honour ``Retry-After`` so callers do not need to sleep between
+    requests to stay under the API rate limits.  ``pool_maxsize`` should cover
+    the number of threads sharing the session.
+
+    Requests to one of ``create_urls`` are not idempotent: after a gateway
+    error or read timeout the record may already exist, so those are only
+    retried when the API rejected them outright (429 or ``Retry-After``) or
+    the connection was never made.  Paths below a create URL, such as
+    ``.../search``, keep the full retry policy.  Both policies draw on one
+    connection pool, so a lookup and the create that follows it can reuse the
+    same keep-alive connection.
+    """
+
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=frozenset(["GET", "POST", "PATCH", "PUT"]),
+            raise_on_status=False,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    create_adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=3,
+            read=0,
+            other=0,
+            backoff_factor=0.5,
+            status_forcelist=[429],
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        ),
+    )
+    # Retries are applied per request by the adapter, so sharing the pool
+    # manager keeps the two policies without a second set of connections.
+    create_adapter.poolmanager = adapter.poolmanager
+    for url in create_urls:
+        # Requests uses the adapter with the longest matching prefix.
+        session.mount(url, create_adapter)
+        session.mount(f"{url}/", adapter)
+    return session
+
+
+class ContactIdCache:
+    """Bounded, expiring map of lower-cased email to HubSpot contact id.
+
+    ``None`` records a known miss.  Every entry lives for the same ``ttl``, so
+    insertion order is expiry order: expired entries are dropped from the front
+    on insert, and the oldest entry is evicted once ``maxsize`` is reached.
+    Safe to share between threads.
+    """
+
+    def __init__(self, maxsize: int = CONTACT_CACHE_SIZE, ttl: float = CONTACT_CACHE_TTL) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[str, Tuple[float, Optional[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, email: str) -> Tuple[bool, Optional[str]]:
+        """Return ``(hit, contact_id)``; a hit may carry ``None`` for a known miss."""
+
+        key = email.lower()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            return True, entry[1]
+
+    def put(self, email: str, contact_id: Optional[str]) -> None:
+        key = email.lower()
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(key, None)
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if oldest[0] > now and len(self._entries) < self._maxsize:
+                    break
+                self._entries.popitem(last=False)
+            self._entries[key] = (now + self._ttl, contact_id)
+
+    def discard(self, email: str) -> None:
+        with self._lock:
+            self._entries.pop(email.lower(), None)
@@ -13,17 +13,67 @@ from __future__ import annotations
 
 import logging
 import os
-import time
+import queue
+import threading
 from dataclasses import dataclass, field
-from typing import Dict, Iterable, List, MutableMapping, Optional
+from typing import Any, Dict, Iterable, Iterator, List, MutableMapping, Optional, Tuple
 
 import requests
 
+from http_utils import ContactIdCache, build_session, dumps, loads
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - ijson is an optional speed-up
+    ijson = None
+
 
 logger = logging.getLogger(__name__)
 
+# HubSpot's CRM batch endpoints accept at most 100 inputs per request.
+HUBSPOT_BATCH_SIZE = 100
+# Airtable accepts at most 10 records per create/update request.
+AIRTABLE_BATCH_SIZE = 10
+AIRTABLE_PAGE_SIZE = 100
+# HubSpot properties read into HubSpotContact's own fields.  Each is read from
+# the Airtable column mapped onto it, or else from a column of the same name.
+STANDARD_PROPERTIES = ("email", "firstname", "lastname", "phone", "company", "lifecyclestage")
+
+
+def _iter_json_items(response: requests.Response, key: str, scalars: Dict[str, Any]) -> Iterator[Any]:
+    """Yield each element of the top-level ``key`` array of a JSON response.
+
+    With ijson available the body is parsed incrementally from the socket, so
+    only one element is held in memory at a time; the response should be
+    requested with ``stream=True``.  Top-level scalar values such as paging
+    cursors are collected into ``scalars``.
+    """
+
+    if ijson is None:
+        data = loads(response.content)
+        scalars.update({name: value for name, value in data.items() if not isinstance(value, (dict, list))})
+        yield from data.get(key, [])
+        return
+    response.raw.decode_content = True
+    item_path = f"{key}.item"
+    builder = None
+    for path, event, value in ijson.parse(response.raw, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if path == item_path and event in ("end_map", "end_array"):
+                yield builder.value
+                builder = None
+        elif path == item_path:
+            if event in ("start_map", "start_array"):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif "." not in path and event in ("string", "number", "boolean", "null"):
+            scalars[path] = value
 
-@dataclass
+
+@dataclass(slots=True)
 class HubSpotContact:
     """Representation of the properties HubSpot expects for a contact."""
 
@@ -57,50 +107,113 @@ class HubSpotClient:
     """Minimal HubSpot client for contact level operations."""
 
     def __init__(self, access_token: str, base_url: str = "https://api.hubapi.com") -> None:
-        self._access_token = access_token
         self._base_url = base_url.rstrip("/")
+        self._contacts_url = f"{self._base_url}/crm/v3/objects/contacts"
+        self._session = build_session(
+            {
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+            },
+            create_urls=(self._contacts_url, f"{self._contacts_url}/batch/create"),
+        )
+        self._contact_ids = ContactIdCache()
 
-    @property
-    def _headers(self) -> Dict[str, str]:
-        return {
-            "Authorization": f"Bearer {self._access_token}",
-            "Content-Type": "application/json",
-        }
+    def invalidate(self, email: Optional[str]) -> None:
+        """Drop any cached contact id for ``email`` after a write."""
+
+        if email:
+            self._contact_ids.discard(email)
 
     def find_contact_by_email(self, email: str) -> Optional[str]:
         """Return the contact id for the provided email if it exists."""
 
-        response = requests.get(
-            f"{self._base_url}/crm/v3/objects/contacts",
-            headers=self._headers,
-            params={"email": email, "properties": "email"},
+        hit, contact_id = self._contact_ids.get(email)
+        if hit:
+            return contact_id
+        response = self._session.post(
+            f"{self._contacts_url}/search",
+            data=dumps({
+                "filterGroups": [
+                    {"filters": [{"propertyName": "email", "operator": "EQ", "value": email}]}
+                ],
+                "properties": ["email"],
+                "limit": 1,
+            }),
             timeout=20,
         )
         response.raise_for_status()
-        data = response.json()
-        results = data.get("results", [])
-        if not results:
-            return None
-        return results[0]["id"]
+        results = loads(response.content).get("results", [])
+        contact_id = results[0]["id"] if results else None
+        self._contact_ids.put(email, contact_id)
+        return contact_id
 
     def create_contact(self, contact: HubSpotContact) -> str:
-        response = requests.post(
-            f"{self._base_url}/crm/v3/objects/contacts",
-            headers=self._headers,
-            json={"properties": contact.to_hubspot_payload()},
+        response = self._session.post(
+            self._contacts_url,
+            data=dumps({"properties": contact.to_hubspot_payload()}),
             timeout=20,
         )
         response.raise_for_status()
-        return response.json()["id"]
+        self.invalidate(contact.email)
+        return loads(response.content)["id"]
 
     def update_contact(self, contact_id: str, properties: Dict[str, Optional[str]]) -> None:
-        response = requests.patch(
-            f"{self._base_url}/crm/v3/objects/contacts/{contact_id}",
-            headers=self._headers,
-            json={"properties": properties},
+        response = self._session.patch(
+            f"{self._contacts_url}/{contact_id}",
+            data=dumps({"properties": properties}),
             timeout=20,
         )
         response.raise_for_status()
+        self.invalidate(properties.get("email"))
+
+    def batch_read_by_email(self, emails: List[str], properties: Iterable[str] = ()) -> Dict[str, Dict[str, Any]]:
+        """Return existing contacts keyed by lower-cased email.
+
+        Each value is the HubSpot result object with ``id`` and the requested
+        ``properties`` (``email`` is always included).
+        """
+
+        with self._session.post(
+            f"{self._contacts_url}/batch/read",
+            data=dumps({
+                "idProperty": "email",
+                "properties": sorted({"email", *properties}),
+                "inputs": [{"id": email} for email in emails],
+            }),
+            timeout=20,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            return {
+                result["properties"]["email"].lower(): result
+                for result in _iter_json_items(response, "results", {})
+                if result.get("properties", {}).get("email")
+            }
+
+    def batch_create(self, payloads: List[Dict[str, Optional[str]]]) -> List[str]:
+        """Create one contact per property payload and return the new ids."""
+
+        response = self._session.post(
+            f"{self._contacts_url}/batch/create",
+            data=dumps({"inputs": [{"properties": payload} for payload in payloads]}),
+            timeout=20,
+        )
+        response.raise_for_status()
+        for payload in payloads:
+            self.invalidate(payload.get("email"))
+        return [result["id"] for result in loads(response.content).get("results", [])]
+
+    def batch_update(self, updates: List[Tuple[str, Dict[str, Optional[str]]]]) -> None:
+        response = self._session.post(
+            f"{self._contacts_url}/batch/update",
+            data=dumps({
+                "inputs": [{"id": contact_id, "properties": properties} for contact_id, properties in updates]
+            }),
+            timeout=20,
+        )
+        response.raise_for_status()
+        for _, properties in updates:
+            self.invalidate(properties.get("email"))
 
 
 class AirtableClient:
@@ -109,45 +222,110 @@ class AirtableClient:
     def __init__(self, base_id: str, api_key: str, base_url: str = "https://api.airtable.com/v0") -> None:
         self._base_url = base_url.rstrip("/")
         self._base_id = base_id
-        self._headers = {
-            "Authorization": f"Bearer {api_key}",
-        }
-
-    def list_records(self, table: str, modified_since: Optional[str] = None) -> Iterable[Dict]:
-        """Yield all records for the table optionally filtered by modified time."""
-
-        params: Dict[str, str] = {}
+        self._session = build_session({"Authorization": f"Bearer {api_key}"})
+
+    def _fetch_pages(self, table: str, params: Dict[str, object], records: queue.Queue, stop: threading.Event) -> None:
+        """Producer for :meth:`list_records`; runs on a background thread."""
+
+        def put(item: object) -> bool:
+            while not stop.is_set():
+                try:
+                    records.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            offset: Optional[str] = None
+            while True:
+                if offset:
+                    params["offset"] = offset
+                page: Dict[str, Any] = {}
+                with self._session.get(
+                    f"{self._base_url}/{self._base_id}/{table}",
+                    params=params,
+                    timeout=20,
+                    stream=True,
+                ) as response:
+                    missing_field = response.status_code == 422 and b"UNKNOWN_FIELD_NAME" in response.content
+                    if missing_field and "fields[]" in params:
+                        # Optional columns may be missing from the table;
+                        # list every field rather than failing the sync.
+                        logger.warning("Table %s lacks a requested field; listing all fields instead", table)
+                        del params["fields[]"]
+                        continue
+                    response.raise_for_status()
+                    for record in _iter_json_items(response, "records", page):
+                        if not put(record):
+                            return
+                offset = page.get("offset")
+                if not offset:
+                    break
+        except Exception as error:  # re-raised on the consumer thread
+            put(error)
+            return
+        put(None)
+
+    def list_records(
+        self,
+        table: str,
+        modified_since: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> Iterable[Dict]:
+        """Yield all records for the table optionally filtered by modified time.
+
+        When ``fields`` is given only those fields are returned for each record;
+        if the table lacks any of them every field is returned instead.  The
+        next page is fetched on a background thread while the caller is
+        still processing the current one.
+        """
+
+        params: Dict[str, object] = {"pageSize": str(AIRTABLE_PAGE_SIZE)}
         if modified_since:
             params["filterByFormula"] = f"DATETIME_COMPARE(LAST_MODIFIED_TIME(), '{modified_since}') >= 0"
-        offset: Optional[str] = None
-        while True:
-            if offset:
-                params["offset"] = offset
-            response = requests.get(
-                f"{self._base_url}/{self._base_id}/{table}",
-                headers=self._headers,
-                params=params,
-                timeout=20,
-            )
-            response.raise_for_status()
-            data = response.json()
-            for record in data.get("records", []):
+        if fields:
+            params["fields[]"] = list(fields)
+        # Holds about two pages so the producer stays a page ahead.
+        records: queue.Queue = queue.Queue(maxsize=2 * AIRTABLE_PAGE_SIZE)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._fetch_pages, args=(table, params, records, stop), daemon=True)
+        worker.start()
+        try:
+            while True:
+                record = records.get()
+                if record is None:
+                    break
+                if isinstance(record, Exception):
+                    raise record
                 yield record
-            offset = data.get("offset")
-            if not offset:
-                break
+        finally:
+            stop.set()
 
     def update_record(self, table: str, record_id: str, fields: Dict[str, Optional[str]]) -> None:
-        response = requests.patch(
+        response = self._session.patch(
             f"{self._base_url}/{self._base_id}/{table}/{record_id}",
-            headers={**self._headers, "Content-Type": "application/json"},
-            json={"fields": fields},
+            headers={"Content-Type": "application/json"},
+            data=dumps({"fields": fields}),
             timeout=20,
         )
         response.raise_for_status()
 
+    def update_records(self, table: str, updates: List[Tuple[str, Dict[str, Optional[str]]]]) -> None:
+        """Patch many records, sending at most ten per request."""
+
+        for start in range(0, len(updates), AIRTABLE_BATCH_SIZE):
+            chunk = updates[start:start + AIRTABLE_BATCH_SIZE]
+            response = self._session.patch(
+                f"{self._base_url}/{self._base_id}/{table}",
+                headers={"Content-Type": "application/json"},
+                data=dumps({"records": [{"id": record_id, "fields": fields} for record_id, fields in chunk]}),
+                timeout=20,
+            )
+            response.raise_for_status()
+
 
-@dataclass
+@dataclass(slots=True)
 class SyncConfig:
     airtable_base_id: str
     airtable_table: str
@@ -171,29 +349,81 @@ class HubSpotAirtableSync:
 
     def _convert_record(self, record: Dict) -> HubSpotContact:
         fields = record.get("fields", {})
-        email = fields.get(self._config.field_mapping.get("email", "email"))
+        # field_mapping is keyed by Airtable field name; look standard
+        # properties up by the Airtable column mapped onto them.
+        airtable_names = {hubspot: airtable for airtable, hubspot in self._config.field_mapping.items()}
+        email = fields.get(airtable_names.get("email", "email"))
         if not email:
             raise ValueError("Airtable record missing required email field")
         custom: Dict[str, Optional[str]] = {}
         for airtable_field, hubspot_field in self._config.field_mapping.items():
-            if hubspot_field in {"email", "firstname", "lastname", "phone", "company", "lifecyclestage"}:
+            if hubspot_field in STANDARD_PROPERTIES:
                 continue
             custom[hubspot_field] = fields.get(airtable_field)
         return HubSpotContact(
             email=email,
-            firstname=fields.get(self._config.field_mapping.get("firstname", "firstname")),
-            lastname=fields.get(self._config.field_mapping.get("lastname", "lastname")),
-            phone=fields.get(self._config.field_mapping.get("phone", "phone")),
-            company=fields.get(self._config.field_mapping.get("company", "company")),
-            lifecycle_stage=fields.get(self._config.field_mapping.get("lifecyclestage", "lifecyclestage")),
+            firstname=fields.get(airtable_names.get("firstname", "firstname")),
+            lastname=fields.get(airtable_names.get("lastname", "lastname")),
+            phone=fields.get(airtable_names.get("phone", "phone")),
+            company=fields.get(airtable_names.get("company", "company")),
+            lifecycle_stage=fields.get(airtable_names.get("lifecyclestage", "lifecyclestage")),
             custom_properties=custom,
         )
 
+    def _push_contacts(self, contacts: List[HubSpotContact]) -> None:
+        """Create or update a buffered batch of contacts in HubSpot."""
+
+        # Later records for the same email win, as they did when rows were
+        # written one at a time.
+        payloads: Dict[str, Dict[str, Optional[str]]] = {}
+        for contact in contacts:
+            payloads.setdefault(contact.email.lower(), {}).update(contact.to_hubspot_payload())
+        properties = {name for payload in payloads.values() for name in payload}
+        existing = self._hubspot.batch_read_by_email(list(payloads), properties)
+        updates: List[Tuple[str, Dict[str, Optional[str]]]] = []
+        creates: List[Dict[str, Optional[str]]] = []
+        for email, payload in payloads.items():
+            contact = existing.get(email)
+            if contact is None:
+                creates.append(payload)
+                continue
+            # Only send properties whose value differs from HubSpot's; the
+            # email matched case-insensitively so it never needs resending.
+            current = contact.get("properties", {})
+            delta = {
+                name: value
+                for name, value in payload.items()
+                if name != "email" and str(current.get(name) or "") != str(value)
+            }
+            if delta:
+                updates.append((contact["id"], delta))
+            else:
+                logger.debug("HubSpot contact %s already up to date", contact["id"])
+        if len(updates) == 1:
+            self._hubspot.update_contact(*updates[0])
+            logger.debug("Updated HubSpot contact %s", updates[0][0])
+        elif updates:
+            self._hubspot.batch_update(updates)
+            logger.debug("Updated %s HubSpot contacts", len(updates))
+        if creates:
+            created = self._hubspot.batch_create(creates)
+            logger.debug("Created HubSpot contacts %s", created)
+
     def sync(self) -> List[str]:
         """Synchronise Airtable records into HubSpot returning processed ids."""
 
         processed: List[str] = []
-        for record in self._airtable.list_records(self._config.airtable_table, self._config.modified_since):
+        pending: List[Tuple[str, HubSpotContact]] = []
+        # Request the mapped columns plus the same-named columns
+        # _convert_record falls back to for unmapped standard properties.
+        mapping = self._config.field_mapping
+        fields = list(mapping) + [name for name in STANDARD_PROPERTIES if name not in mapping.values()]
+        records = self._airtable.list_records(
+            self._config.airtable_table,
+            self._config.modified_since,
+            fields=fields,
+        )
+        for record in records:
             record_id = record.get("id")
             try:
                 contact = self._convert_record(record)
@@ -204,16 +434,14 @@ class HubSpotAirtableSync:
             if self._config.dry_run:
                 processed.append(record_id)
                 continue
-            hubspot_id = self._hubspot.find_contact_by_email(contact.email)
-            payload = contact.to_hubspot_payload()
-            if hubspot_id:
-                self._hubspot.update_contact(hubspot_id, payload)
-                logger.debug("Updated HubSpot contact %s", hubspot_id)
-            else:
-                hubspot_id = self._hubspot.create_contact(contact)
-                logger.debug("Created HubSpot contact %s", hubspot_id)
-            processed.append(record_id)
-            time.sleep(0.2)  # avoid throttling
+            pending.append((record_id, contact))
+            if len(pending) >= HUBSPOT_BATCH_SIZE:
+                self._push_contacts([contact for _, contact in pending])
+                processed.extend(record_id for record_id, _ in pending)
+                pending = []
+        if pending:
+            self._push_contacts([contact for _, contact in pending])
+            processed.extend(record_id for record_id, _ in pending)
         return processed
 
 
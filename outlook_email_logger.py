@@ -4,16 +4,26 @@ from __future__ import annotations
 import datetime as dt
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import requests
 
+from http_utils import build_session, dumps, loads
+
 
 logger = logging.getLogger(__name__)
 
+# HubSpot's search API accepts at most 100 values for an IN filter.
+HUBSPOT_SEARCH_BATCH_SIZE = 100
+ENGAGEMENT_WORKERS = 8
+# The only message properties log_recent_messages reads.
+MESSAGE_FIELDS = "subject,bodyPreview,receivedDateTime,toRecipients,ccRecipients,bccRecipients"
+
 
-@dataclass
+@dataclass(slots=True)
 class OutlookConfig:
     tenant_id: str
     client_id: str
@@ -30,9 +40,11 @@ class OutlookGraphClient:
     def __init__(self, config: OutlookConfig) -> None:
         self._config = config
         self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._cached_headers: Optional[Dict[str, str]] = None
 
     def _authenticate(self) -> str:
-        if self._token:
+        if self._token and time.monotonic() < self._expires_at:
             return self._token
         response = requests.post(
             f"https://login.microsoftonline.com/{self._config.tenant_id}/oauth2/v2.0/token",
@@ -45,65 +57,114 @@ class OutlookGraphClient:
             timeout=20,
         )
         response.raise_for_status()
-        self._token = response.json()["access_token"]
+        data = loads(response.content)
+        self._token = data["access_token"]
+        # Refresh a minute early so a request never goes out with a token
+        # that expires in flight.
+        self._expires_at = time.monotonic() + float(data.get("expires_in", 3600)) - 60
+        self._cached_headers = None
         return self._token
 
     @property
     def _headers(self) -> Dict[str, str]:
         token = self._authenticate()
-        return {"Authorization": f"Bearer {token}"}
+        if self._cached_headers is None:
+            self._cached_headers = {"Authorization": f"Bearer {token}"}
+        return self._cached_headers
 
     def list_messages(self, since: dt.datetime) -> Iterable[Dict]:
-        response = requests.get(
-            f"{self._config.graph_base_url}/users/{self._config.user_email}/messages",
-            headers=self._headers,
-            params={
-                "$filter": f"receivedDateTime ge {since.isoformat()}Z",
-                "$orderby": "receivedDateTime desc",
-                "$top": 50,
-            },
-            timeout=20,
-        )
-        response.raise_for_status()
-        for message in response.json().get("value", []):
-            yield message
+        url: Optional[str] = f"{self._config.graph_base_url}/users/{self._config.user_email}/messages"
+        params: Optional[Dict[str, object]] = {
+            "$filter": f"receivedDateTime ge {since.isoformat()}Z",
+            "$orderby": "receivedDateTime desc",
+            "$select": MESSAGE_FIELDS,
+            "$top": 50,
+        }
+        while url:
+            response = requests.get(url, headers=self._headers, params=params, timeout=20)
+            response.raise_for_status()
+            data = loads(response.content)
+            for message in data.get("value", []):
+                yield message
+            # The next link already carries the original query options.
+            url = data.get("@odata.nextLink")
+            params = None
 
 
 class HubSpotTimelineClient:
     def __init__(self, access_token: str, base_url: str) -> None:
-        self._access_token = access_token
         self._base_url = base_url.rstrip("/")
+        self._search_url = f"{self._base_url}/crm/v3/objects/contacts/search"
+        # Sized for the engagement worker pool.
+        self._session = build_session(
+            {
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+            },
+            pool_maxsize=ENGAGEMENT_WORKERS * 2,
+            create_urls=(f"{self._base_url}/engagements/v1/engagements",),
+        )
+        # Lower-cased email -> contact id, with None recording a known miss.
+        # Unlike the shared ContactIdCache this is a plain per-run dict:
+        # log_recent_messages clears it at the start of every run, so it only
+        # ever holds that run's recipients, and find_contact_ids reads its
+        # answers back out of it, so entries must not expire or be evicted
+        # part-way through a call.
+        self._contact_ids: Dict[str, Optional[str]] = {}
 
-    @property
-    def _headers(self) -> Dict[str, str]:
-        return {
-            "Authorization": f"Bearer {self._access_token}",
-            "Content-Type": "application/json",
-        }
+    def clear_cache(self) -> None:
+        self._contact_ids.clear()
 
     def find_contact_id(self, email: str) -> Optional[str]:
-        response = requests.get(
-            f"{self._base_url}/crm/v3/objects/contacts/search",
-            headers=self._headers,
-            json={
+        key = email.lower()
+        if key in self._contact_ids:
+            return self._contact_ids[key]
+        response = self._session.post(
+            self._search_url,
+            data=dumps({
                 "filterGroups": [
                     {"filters": [{"propertyName": "email", "operator": "EQ", "value": email}]}
                 ],
                 "limit": 1,
-            },
+            }),
             timeout=20,
         )
         response.raise_for_status()
-        results = response.json().get("results", [])
-        if not results:
-            return None
-        return results[0]["id"]
+        results = loads(response.content).get("results", [])
+        contact_id = results[0]["id"] if results else None
+        self._contact_ids[key] = contact_id
+        return contact_id
+
+    def find_contact_ids(self, emails: Iterable[str]) -> Dict[str, str]:
+        """Resolve many emails at once, returning lower-cased email to contact id."""
+
+        requested = {email.lower() for email in emails}
+        unique = sorted(requested - self._contact_ids.keys())
+        for start in range(0, len(unique), HUBSPOT_SEARCH_BATCH_SIZE):
+            chunk = unique[start:start + HUBSPOT_SEARCH_BATCH_SIZE]
+            response = self._session.post(
+                self._search_url,
+                data=dumps({
+                    "filterGroups": [
+                        {"filters": [{"propertyName": "email", "operator": "IN", "values": chunk}]}
+                    ],
+                    "properties": ["email"],
+                    "limit": HUBSPOT_SEARCH_BATCH_SIZE,
+                }),
+                timeout=20,
+            )
+            response.raise_for_status()
+            self._contact_ids.update(dict.fromkeys(chunk))
+            for result in loads(response.content).get("results", []):
+                email = result.get("properties", {}).get("email")
+                if email:
+                    self._contact_ids[email.lower()] = result["id"]
+        return {email: self._contact_ids[email] for email in requested if self._contact_ids.get(email)}
 
     def create_email_engagement(self, contact_id: str, subject: str, body: str, received_at: dt.datetime) -> str:
-        response = requests.post(
+        response = self._session.post(
             f"{self._base_url}/engagements/v1/engagements",
-            headers=self._headers,
-            json={
+            data=dumps({
                 "engagement": {
                     "active": True,
                     "type": "EMAIL",
@@ -114,11 +175,11 @@ class HubSpotTimelineClient:
                     "subject": subject,
                     "text": body,
                 },
-            },
+            }),
             timeout=20,
         )
         response.raise_for_status()
-        return response.json()["engagement"].get("id")
+        return loads(response.content)["engagement"].get("id")
 
 
 class OutlookEmailLogger:
@@ -139,21 +200,35 @@ class OutlookEmailLogger:
                     addresses.append(email)
         return addresses
 
+    def _process_one(self, job: Tuple[str, str, str, dt.datetime]) -> str:
+        contact_id, subject, body_preview, received_at = job
+        return self._hubspot.create_email_engagement(contact_id, subject, body_preview, received_at)
+
     def log_recent_messages(self, since: dt.datetime) -> List[str]:
-        created: List[str] = []
+        # Contacts may have been created since the previous run.
+        self._hubspot.clear_cache()
+        pending: List[Tuple[str, str, str, dt.datetime]] = []
+        addresses: Set[str] = set()
         for message in self._outlook.list_messages(since):
             recipients = self._extract_recipients(message)
             subject = message.get("subject", "(no subject)")
             body_preview = message.get("bodyPreview", "")
             received_at = dt.datetime.fromisoformat(message["receivedDateTime"].replace("Z", "+00:00"))
             for address in recipients:
-                contact_id = self._hubspot.find_contact_id(address)
-                if not contact_id:
-                    logger.debug("No HubSpot contact for %s", address)
-                    continue
-                engagement_id = self._hubspot.create_email_engagement(contact_id, subject, body_preview, received_at)
-                created.append(engagement_id)
-        return created
+                pending.append((address, subject, body_preview, received_at))
+                addresses.add(address)
+        if not pending:
+            return []
+        contact_ids = self._hubspot.find_contact_ids(addresses)
+        jobs: List[Tuple[str, str, str, dt.datetime]] = []
+        for address, subject, body_preview, received_at in pending:
+            contact_id = contact_ids.get(address.lower())
+            if not contact_id:
+                logger.debug("No HubSpot contact for %s", address)
+                continue
+            jobs.append((contact_id, subject, body_preview, received_at))
+        with ThreadPoolExecutor(max_workers=ENGAGEMENT_WORKERS) as executor:
+            return list(executor.map(self._process_one, jobs))
 
 
 def load_config_from_env() -> OutlookConfig:
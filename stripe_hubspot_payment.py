@@ -1,21 +1,30 @@
 """Stripe webhook processing that logs successful payments into HubSpot."""
 from __future__ import annotations
 
+import binascii
 import hmac
-import json
 import logging
 import os
+import time
 from dataclasses import dataclass
-from hashlib import sha256
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 
-import requests
+from http_utils import ContactIdCache, build_session, dumps, loads
 
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+def _unhex(value: bytes) -> bytes:
+    """Decode a hex digest, treating malformed input as an empty digest."""
+
+    try:
+        return binascii.unhexlify(value)
+    except binascii.Error:
+        return b""
+
+
+@dataclass(slots=True)
 class StripeWebhookConfig:
     signing_secret: str
     hubspot_access_token: str
@@ -27,17 +36,52 @@ class StripeWebhookHandler:
 
     def __init__(self, config: StripeWebhookConfig) -> None:
         self._config = config
-
-    def verify_signature(self, payload: bytes, signature: str, tolerance: int = 300) -> bool:
-        """Validate that the provided signature matches the payload."""
-
-        try:
-            timestamp, received_signature = signature.split(",", 1)[1].split("=", 1)
-        except ValueError as exc:  # pragma: no cover - defensive parsing
-            raise ValueError("Invalid Stripe signature header") from exc
-        message = f"{timestamp}.{payload.decode()}".encode()
-        computed = hmac.new(self._config.signing_secret.encode(), msg=message, digestmod=sha256).hexdigest()
-        is_valid = hmac.compare_digest(computed, received_signature)
+        self._secret_bytes = config.signing_secret.encode()
+        self._notes_url = f"{config.hubspot_base_url}/crm/v3/objects/notes"
+        # Webhook servers may share one handler across request threads, so
+        # keep enough warm connections for a burst of concurrent events.
+        self._session = build_session(
+            {
+                "Authorization": f"Bearer {config.hubspot_access_token}",
+                "Content-Type": "application/json",
+            },
+            pool_maxsize=32,
+            create_urls=(self._notes_url,),
+        )
+        self._contact_ids = ContactIdCache()
+
+    def close(self) -> None:
+        """Release pooled HubSpot connections."""
+
+        self._session.close()
+
+    def verify_signature(self, payload: bytes, signature: Union[str, bytes], tolerance: int = 300) -> bool:
+        """Validate that the provided signature matches the payload.
+
+        ``signature`` is the raw ``Stripe-Signature`` header
+        (``t=<timestamp>,v1=<hex digest>,...``).  While a signing secret is
+        being rolled Stripe sends several ``v1`` entries; any one matching is
+        enough.  Signatures older or newer than ``tolerance`` seconds are
+        rejected; pass ``0`` to skip the check.
+        """
+
+        raw = signature.encode() if isinstance(signature, str) else signature
+        timestamp = b""
+        received_signatures = []
+        for item in raw.split(b","):
+            key, _, value = item.strip().partition(b"=")
+            if key == b"t":
+                timestamp = value
+            elif key == b"v1":
+                received_signatures.append(value)
+        if not timestamp.isdigit() or not received_signatures:
+            raise ValueError("Invalid Stripe signature header")
+        if tolerance and abs(time.time() - int(timestamp)) > tolerance:
+            logger.warning("Signature timestamp outside the %s second tolerance", tolerance)
+            return False
+        message = timestamp + b"." + payload
+        computed = hmac.digest(self._secret_bytes, message, "sha256")
+        is_valid = any(hmac.compare_digest(computed, _unhex(received)) for received in received_signatures)
         if not is_valid:
             logger.warning("Signature verification failed")
         return is_valid
@@ -67,18 +111,13 @@ class StripeWebhookHandler:
         deal_name = data_object.get("metadata", {}).get("dealname", "Payment")
         return f"Stripe event `{event_type}` logged for {deal_name} totalling {amount_display}."
 
-    @property
-    def _headers(self) -> Dict[str, str]:
-        return {
-            "Authorization": f"Bearer {self._config.hubspot_access_token}",
-            "Content-Type": "application/json",
-        }
-
     def _find_contact_id(self, email: str) -> Optional[str]:
-        response = requests.get(
+        hit, contact_id = self._contact_ids.get(email)
+        if hit:
+            return contact_id
+        response = self._session.post(
             f"{self._config.hubspot_base_url}/crm/v3/objects/contacts/search",
-            headers=self._headers,
-            json={
+            data=dumps({
                 "filterGroups": [
                     {
                         "filters": [
@@ -87,30 +126,32 @@ class StripeWebhookHandler:
                     }
                 ],
                 "limit": 1,
-            },
+            }),
             timeout=20,
         )
         response.raise_for_status()
-        results = response.json().get("results", [])
-        if not results:
-            return None
-        return results[0]["id"]
+        results = loads(response.content).get("results", [])
+        contact_id = results[0]["id"] if results else None
+        self._contact_ids.put(email, contact_id)
+        return contact_id
 
     def _create_timeline_note(self, contact_id: str, note: str) -> str:
-        response = requests.post(
-            f"{self._config.hubspot_base_url}/crm/v3/objects/notes",
-            headers=self._headers,
-            json={"properties": {"hs_note_body": note}},
+        response = self._session.post(
+            self._notes_url,
+            data=dumps({
+                "properties": {"hs_note_body": note, "hs_timestamp": int(time.time() * 1000)},
+                # Associate in the create call rather than with a follow-up PUT.
+                "associations": [
+                    {
+                        "to": {"id": contact_id},
+                        "types": [{"associationCategory": "HUBSPOT_DEFINED", "associationTypeId": 202}],
+                    }
+                ],
+            }),
             timeout=20,
         )
         response.raise_for_status()
-        note_id = response.json()["id"]
-        requests.put(
-            f"{self._config.hubspot_base_url}/crm/v3/objects/notes/{note_id}/associations/contact/{contact_id}/notes_to_contacts",
-            headers=self._headers,
-            timeout=20,
-        ).raise_for_status()
-        return note_id
+        return loads(response.content)["id"]
 
 
 def load_config_from_env() -> StripeWebhookConfig:
@@ -127,7 +168,7 @@ def main(payload: str, signature_header: str) -> Optional[str]:
     handler = StripeWebhookHandler(config)
     if not handler.verify_signature(payload.encode(), signature_header):
         raise ValueError("Invalid Stripe signature")
-    event = json.loads(payload)
+    event = loads(payload)
     return handler.handle_event(event)
 
 
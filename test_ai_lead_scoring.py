@@ -0,0 +1,71 @@
+"""Tests for the lead scoring model's outputs across its scoring entry points."""
+from __future__ import annotations
+
+import math
+import unittest
+
+from ai_lead_scoring import DEFAULT_SCORER, LeadFeatures, LeadScorer, score_lead
+
+RECORD = {
+    "lead_id": "lead-1",
+    "email_engagement_rate": 0.5,
+    "meetings_completed": 1,
+    "deal_stage": "closedwon",
+    "industry_fit": 0.5,
+    "annual_revenue": 10000.0,
+    "intent_score": 0.5,
+    "custom_attributes": {"inbound_velocity": 0.3},
+}
+
+
+def _features(record: dict) -> LeadFeatures:
+    return LeadFeatures(
+        email_engagement_rate=record["email_engagement_rate"],
+        meetings_completed=record["meetings_completed"],
+        deal_stage=record["deal_stage"],
+        industry_fit=record["industry_fit"],
+        annual_revenue=record["annual_revenue"],
+        intent_score=record["intent_score"],
+        custom_attributes=dict(record["custom_attributes"]),
+    )
+
+
+class DealStageContributionTest(unittest.TestCase):
+    def test_closedwon_contribution_is_pinned(self) -> None:
+        result = DEFAULT_SCORER.score("lead-1", _features(RECORD))
+        self.assertEqual(result.contributing_factors["deal_stage"], 2.0)
+        expected_sum = -2.0 + 0.6 + 0.8 + 0.75 + 0.01 + 0.5 + 2.0 + 0.21
+        self.assertAlmostEqual(result.probability_to_close, 1 / (1 + math.exp(-expected_sum)), places=12)
+
+    def test_unweighted_stage_contributes_nothing(self) -> None:
+        result = DEFAULT_SCORER.score("lead-1", _features({**RECORD, "deal_stage": "not-a-stage"}))
+        self.assertNotIn("deal_stage", result.contributing_factors)
+
+    def test_plain_deal_stage_weight_scales_stage_weights(self) -> None:
+        scorer = LeadScorer({"deal_stage::closedwon": 2.0, "deal_stage": 0.5})
+        result = scorer.score("lead-1", _features(RECORD))
+        self.assertEqual(result.contributing_factors, {"deal_stage": 1.0})
+
+
+class EntryPointAgreementTest(unittest.TestCase):
+    def test_score_batch_score_and_score_lead_agree(self) -> None:
+        records = [
+            RECORD,
+            {**RECORD, "lead_id": "lead-2", "deal_stage": "contractsent", "meetings_completed": 3},
+            {**RECORD, "lead_id": "lead-3", "deal_stage": "lead", "custom_attributes": {}},
+            {**RECORD, "lead_id": "lead-4", "deal_stage": None, "intent_score": 0.0},
+        ]
+        batch_results = list(DEFAULT_SCORER.batch_score(iter(records)))
+        probabilities = DEFAULT_SCORER.batch_score_array(records)
+        for record, batch_result, probability in zip(records, batch_results, probabilities.tolist()):
+            features = _features({**record, "deal_stage": str(record["deal_stage"])})
+            with self.subTest(lead=record["lead_id"]):
+                single = DEFAULT_SCORER.score(record["lead_id"], features)
+                self.assertEqual(single, batch_result)
+                self.assertEqual(single, score_lead(record["lead_id"], features))
+                # The array path runs in float32.
+                self.assertAlmostEqual(single.probability_to_close, probability, places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
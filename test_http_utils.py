@@ -0,0 +1,128 @@
+"""Tests for the shared HTTP session and contact-id cache helpers."""
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+import http_utils
+from http_utils import ContactIdCache, build_session
+from hubspot_airtable_sync import HubSpotClient
+from outlook_email_logger import HubSpotTimelineClient
+from stripe_hubspot_payment import StripeWebhookConfig, StripeWebhookHandler
+
+BASE_URL = "https://api.hubapi.com"
+CONTACTS_URL = f"{BASE_URL}/crm/v3/objects/contacts"
+
+
+class BuildSessionRetryTest(unittest.TestCase):
+    def assertCreatePolicy(self, session, url: str) -> None:
+        retries = session.get_adapter(url).max_retries
+        self.assertEqual(list(retries.status_forcelist), [429], url)
+        self.assertEqual(retries.read, 0, url)
+        self.assertEqual(retries.other, 0, url)
+
+    def assertFullPolicy(self, session, url: str) -> None:
+        retries = session.get_adapter(url).max_retries
+        self.assertEqual(list(retries.status_forcelist), [429, 502, 503, 504], url)
+        self.assertIsNone(retries.read, url)
+        self.assertIn("POST", retries.allowed_methods, url)
+
+    def test_sync_contact_endpoints(self) -> None:
+        session = HubSpotClient("token", base_url=BASE_URL)._session
+        for url in (CONTACTS_URL, f"{CONTACTS_URL}/batch/create"):
+            self.assertCreatePolicy(session, url)
+        for url in (
+            f"{CONTACTS_URL}/search",
+            f"{CONTACTS_URL}/batch/read",
+            f"{CONTACTS_URL}/batch/update",
+            f"{CONTACTS_URL}/12345",
+            "https://api.airtable.com/v0/base/table",
+        ):
+            self.assertFullPolicy(session, url)
+
+    def test_stripe_note_create(self) -> None:
+        handler = StripeWebhookHandler(StripeWebhookConfig(signing_secret="secret", hubspot_access_token="token"))
+        self.addCleanup(handler.close)
+        self.assertCreatePolicy(handler._session, f"{BASE_URL}/crm/v3/objects/notes")
+        self.assertFullPolicy(handler._session, f"{CONTACTS_URL}/search")
+
+    def test_outlook_engagement_create(self) -> None:
+        session = HubSpotTimelineClient("token", BASE_URL)._session
+        self.assertCreatePolicy(session, f"{BASE_URL}/engagements/v1/engagements")
+        self.assertFullPolicy(session, f"{CONTACTS_URL}/search")
+
+    def test_policies_share_one_connection_pool(self) -> None:
+        session = build_session({}, create_urls=(CONTACTS_URL,))
+        create_adapter = session.get_adapter(CONTACTS_URL)
+        search_adapter = session.get_adapter(f"{CONTACTS_URL}/search")
+        self.assertIsNot(create_adapter, search_adapter)
+        self.assertIs(create_adapter.poolmanager, search_adapter.poolmanager)
+
+
+class ContactIdCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 1000.0
+        patcher = mock.patch.object(http_utils.time, "monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_is_case_insensitive(self) -> None:
+        cache = ContactIdCache()
+        cache.put("Lead@Example.com", "101")
+        self.assertEqual(cache.get("lead@example.COM"), (True, "101"))
+        self.assertEqual(cache.get("other@example.com"), (False, None))
+
+    def test_cached_miss(self) -> None:
+        cache = ContactIdCache()
+        cache.put("missing@example.com", None)
+        self.assertEqual(cache.get("missing@example.com"), (True, None))
+
+    def test_entries_expire_after_ttl(self) -> None:
+        cache = ContactIdCache(ttl=60.0)
+        cache.put("a@example.com", "1")
+        self.now += 59.0
+        self.assertEqual(cache.get("a@example.com"), (True, "1"))
+        self.now += 1.0
+        self.assertEqual(cache.get("a@example.com"), (False, None))
+        self.assertEqual(len(cache), 0)
+
+    def test_expired_entries_are_dropped_on_insert(self) -> None:
+        cache = ContactIdCache(ttl=60.0)
+        cache.put("a@example.com", "1")
+        cache.put("b@example.com", "2")
+        self.now += 30.0
+        cache.put("c@example.com", "3")
+        self.now += 31.0
+        cache.put("d@example.com", "4")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("c@example.com"), (True, "3"))
+
+    def test_oldest_entry_is_evicted_at_maxsize(self) -> None:
+        cache = ContactIdCache(maxsize=3)
+        for index in range(3):
+            cache.put(f"{index}@example.com", str(index))
+            self.now += 1.0
+        cache.put("3@example.com", "3")
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get("0@example.com"), (False, None))
+        for index in range(1, 4):
+            self.assertEqual(cache.get(f"{index}@example.com"), (True, str(index)))
+
+    def test_refreshing_an_entry_moves_it_to_the_back(self) -> None:
+        cache = ContactIdCache(maxsize=2)
+        cache.put("a@example.com", "1")
+        cache.put("b@example.com", "2")
+        cache.put("a@example.com", "1")
+        cache.put("c@example.com", "3")
+        self.assertEqual(cache.get("a@example.com"), (True, "1"))
+        self.assertEqual(cache.get("b@example.com"), (False, None))
+
+    def test_discard(self) -> None:
+        cache = ContactIdCache()
+        cache.put("a@example.com", "1")
+        cache.discard("A@example.com")
+        self.assertEqual(cache.get("a@example.com"), (False, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Tests for the HubSpot/Airtable sync's response parsing."""
+from __future__ import annotations
+
+import io
+import json
+import unittest
+from unittest import mock
+
+import requests
+
+import hubspot_airtable_sync
+from hubspot_airtable_sync import _iter_json_items
+
+BODIES = {
+    "nested": {
+        "records": [
+            {"id": "rec1", "fields": {"Email": "a@example.com", "Tags": ["x", ["y", {"z": 1}]], "Score": 1.5}},
+            {"id": "rec2", "fields": {}, "records": [{"id": "inner"}]},
+        ],
+        "offset": "itr2/rec2",
+    },
+    "scalar items": {"records": ["a", 1, 2.5, True, None, [], {}]},
+    "scalars after the array": {"records": [[1, [2, 3]], {"a": []}], "offset": None, "count": 2, "more": False},
+    "empty": {"records": [], "offset": "next"},
+    "missing key": {"results": [{"id": "1"}], "paging": {"next": {"after": "2"}}},
+}
+
+
+def _response(body: dict) -> requests.Response:
+    content = json.dumps(body).encode("utf-8")
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    response.raw = io.BytesIO(content)
+    return response
+
+
+class IterJsonItemsTest(unittest.TestCase):
+    def _parse(self, body: dict, incremental: bool):
+        scalars: dict = {}
+        if incremental:
+            items = list(_iter_json_items(_response(body), "records", scalars))
+        else:
+            with mock.patch.object(hubspot_airtable_sync, "ijson", None):
+                items = list(_iter_json_items(_response(body), "records", scalars))
+        return items, scalars
+
+    def test_fallback_matches_the_document(self) -> None:
+        for name, body in BODIES.items():
+            with self.subTest(name):
+                items, scalars = self._parse(body, incremental=False)
+                self.assertEqual(items, body.get("records", []))
+                expected = {key: value for key, value in body.items() if not isinstance(value, (dict, list))}
+                self.assertEqual(scalars, expected)
+
+    @unittest.skipIf(hubspot_airtable_sync.ijson is None, "ijson is not installed")
+    def test_incremental_parse_matches_fallback(self) -> None:
+        for name, body in BODIES.items():
+            with self.subTest(name):
+                self.assertEqual(self._parse(body, incremental=True), self._parse(body, incremental=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Regression tests for Stripe webhook signature verification."""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import time
+import unittest
+
+from stripe_hubspot_payment import StripeWebhookConfig, StripeWebhookHandler
+
+SECRET = "whsec_test"
+PAYLOAD = b'{"id": "evt_1", "type": "invoice.payment_succeeded"}'
+
+
+def _sign(payload: bytes, timestamp: int, secret: str = SECRET) -> str:
+    message = f"{timestamp}.".encode() + payload
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class VerifySignatureTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.handler = StripeWebhookHandler(StripeWebhookConfig(signing_secret=SECRET, hubspot_access_token="token"))
+        self.addCleanup(self.handler.close)
+        self.now = int(time.time())
+
+    def test_valid_signature(self) -> None:
+        header = f"t={self.now},v1={_sign(PAYLOAD, self.now)}"
+        self.assertTrue(self.handler.verify_signature(PAYLOAD, header))
+        self.assertTrue(self.handler.verify_signature(PAYLOAD, header.encode()))
+
+    def test_stale_signature(self) -> None:
+        stale = self.now - 600
+        header = f"t={stale},v1={_sign(PAYLOAD, stale)}"
+        self.assertFalse(self.handler.verify_signature(PAYLOAD, header))
+        self.assertTrue(self.handler.verify_signature(PAYLOAD, header, tolerance=0))
+
+    def test_tampered_payload(self) -> None:
+        header = f"t={self.now},v1={_sign(PAYLOAD, self.now)}"
+        self.assertFalse(self.handler.verify_signature(PAYLOAD.replace(b"evt_1", b"evt_2"), header))
+
+    def test_tampered_timestamp(self) -> None:
+        header = f"t={self.now + 1},v1={_sign(PAYLOAD, self.now)}"
+        self.assertFalse(self.handler.verify_signature(PAYLOAD, header))
+
+    def test_any_of_multiple_v1_signatures(self) -> None:
+        old = _sign(PAYLOAD, self.now, secret="whsec_old")
+        header = f"t={self.now},v1={old},v1={_sign(PAYLOAD, self.now)},v0=deadbeef"
+        self.assertTrue(self.handler.verify_signature(PAYLOAD, header))
+        self.assertFalse(self.handler.verify_signature(PAYLOAD, f"t={self.now},v1={old},v1=zz"))
+
+    def test_keys_are_parsed_not_searched(self) -> None:
+        header = f"v1={_sign(PAYLOAD, self.now)}, t={self.now}"
+        self.assertTrue(self.handler.verify_signature(PAYLOAD, header))
+        with self.assertRaises(ValueError):
+            self.handler.verify_signature(PAYLOAD, f"xt={self.now},v1={_sign(PAYLOAD, self.now)}")
+
+    def test_malformed_header(self) -> None:
+        for header in ("", f"t={self.now}", "v1=abcd", "t=abc,v1=abcd"):
+            with self.subTest(header=header), self.assertRaises(ValueError):
+                self.handler.verify_signature(PAYLOAD, header)
+
+
+if __name__ == "__main__":
+    unittest.main()